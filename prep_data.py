@@ -1,126 +1,476 @@
 import argparse
+import os
+import re
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
-from rich.console import Console
 from utils.config_loader import Preper, read_config_file
-from utils.log_utils import prompt_user_command, status, run_command
+from utils.log_utils import get_console, info, install_sigint_handler, make_progress, prompt_user_command, run_command, wait_command
 import logging
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+CONSOLE = get_console()
+
+_FRAME_NUMBER_RE = re.compile(r'(\d+)')
+
+def _cmd(*parts: str) -> list:
+    '''
+    builds an argv list from bare string tokens, one allocation per argument
+    '''
+    return list(parts)
+
+def is_sequential_capture(image_dir: Path) -> bool:
+    '''
+    checks whether the images look like a video-style sequential capture,
+    i.e. at least 90% of the filenames carry a near-consecutive numeric suffix
+    '''
+    if not Path(image_dir).is_dir():
+        return False
+    files = [f for f in Path(image_dir).iterdir() if f.is_file()]
+    if len(files) < 2:
+        return False
+    numbers = []
+    for f in files:
+        match = _FRAME_NUMBER_RE.search(f.stem)
+        if match:
+            numbers.append(int(match.group(1)))
+    if len(numbers) < 0.9 * len(files):
+        return False
+    numbers.sort()
+    # near-consecutive: the numbering spans at most ~2x the file count
+    return numbers[-1] - numbers[0] <= 2 * len(numbers)
+
+
+def _gpu_ids() -> list:
+    '''
+    the CUDA device ids visible to child processes, defaulting to ["0"].
+    when CUDA_VISIBLE_DEVICES is already set, returns its entries so a
+    user-chosen subset like "2,3" is respected rather than remapped to 0,1
+    '''
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible:
+        ids = [d.strip() for d in visible.split(",") if d.strip()]
+        if ids:
+            return ids
+    try:
+        return [str(i) for i in range(len(os.listdir("/proc/driver/nvidia/gpus")))] or ["0"]
+    except OSError:
+        return ["0"]
+
+
+def run_sharded_extraction(preper: Preper,
+                           num_shards: int,
+                           verbose: bool = False,
+                           timeout: float = None
+                           ) -> None:
+    '''
+    shards image_dir into num_shards symlinked sub-dirs, runs one feature_extractor
+    per shard (round-robin over the visible GPUs) into per-shard databases, then
+    merges the shard databases into preper.database_path
+    '''
+    database_path = Path(preper.database_path)
+    image_files = sorted(e.path for e in os.scandir(preper.image_dir) if e.is_file())
+    num_shards = min(num_shards, len(image_files))
+    shard_root = database_path.parent / f"{database_path.stem}_shards"
+    gpu_ids = _gpu_ids()
+    threads = str(max(1, preper.num_threads // num_shards))
+
+    procs = []
+    shard_dbs = []
+    for k in range(num_shards):
+        shard_dir = shard_root / f"shard_{k}"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        for image in image_files[k::num_shards]:
+            link = shard_dir / Path(image).name
+            if not link.is_symlink():
+                os.symlink(image, link)
+        shard_db = shard_root / f"shard_{k}.db"
+        shard_dbs.append(shard_db)
+        feature_extractor_cmd = _cmd(
+            "colmap", "feature_extractor",
+            "--database_path", str(shard_db),
+            "--image_path", str(shard_dir),
+            "--ImageReader.single_camera", "1",
+            "--ImageReader.camera_model", str(preper.camera_model),
+            "--SiftExtraction.use_gpu", str(preper.use_gpu),
+            "--SiftExtraction.num_threads", threads,
+        )
+        if verbose:
+            print(f"feature_extractor_cmd={' '.join(feature_extractor_cmd)}")
+        logger.info("Command >> %s", " ".join(feature_extractor_cmd))
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES=gpu_ids[k % len(gpu_ids)])
+        proc = run_command(cmd=feature_extractor_cmd, verbose=verbose, console=CONSOLE,
+                           async_mode=True, env=env)
+        procs.append((proc, feature_extractor_cmd))
+
+    # drain every shard's stdout concurrently; waiting on them one at a time
+    # lets a later shard fill its 64 KiB pipe and stall until the earlier
+    # shards finish, serializing the extractors
+    with ThreadPoolExecutor(max_workers=len(procs)) as executor:
+        drains = [executor.submit(wait_command, proc, cmd, CONSOLE, timeout)
+                  for proc, cmd in procs]
+        for drain in drains:
+            drain.result()
+
+    # fold the shard databases into the final one pairwise
+    merged = shard_dbs[0]
+    for k, shard_db in enumerate(shard_dbs[1:], start=1):
+        out = database_path if k == len(shard_dbs) - 1 else shard_root / f"merged_{k}.db"
+        merger_cmd = _cmd(
+            "colmap", "database_merger",
+            "--database_path1", str(merged),
+            "--database_path2", str(shard_db),
+            "--merged_database_path", str(out),
+        )
+        logger.info("Command >> %s", " ".join(merger_cmd))
+        run_command(cmd=merger_cmd, verbose=verbose, console=CONSOLE, timeout=timeout)
+        merged = out
+    if len(shard_dbs) == 1:
+        shard_dbs[0].replace(database_path)
+    shutil.rmtree(shard_root, ignore_errors=True)
+
+
+def _db_count(database_path: Path, table: str) -> int:
+    '''
+    counts the rows of a table in a COLMAP database, -1 if the db or table is missing
+    '''
+    if not Path(database_path).exists():
+        return -1
+    try:
+        con = sqlite3.connect(database_path)
+        try:
+            return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return -1
+
+def extraction_is_complete(database_path: Path, image_dir: Path) -> bool:
+    '''
+    checks whether the database already holds keypoints for every image in image_dir
+    '''
+    num_images = sum(1 for f in Path(image_dir).iterdir() if f.is_file())
+    return num_images > 0 \
+        and _db_count(database_path, "images") == num_images \
+        and _db_count(database_path, "keypoints") >= num_images
+
+def matching_is_complete(database_path: Path) -> bool:
+    '''
+    checks whether the database already holds verified matches
+    '''
+    return _db_count(database_path, "two_view_geometries") > 0
+
+def mapping_is_complete(sparse_dir: Path) -> bool:
+    '''
+    checks whether a reconstruction was already written to sparse_dir
+    '''
+    return (Path(sparse_dir) / "0" / "cameras.bin").exists()
+
 
 def run_sfm(config_file: Path,
             output_dir: Path,
             vocab_tree_path: Path,
             prompt: bool,
-            verbose: bool = False
+            verbose: bool = False,
+            force_matching_method: bool = False,
+            num_threads: int = None,
+            timeout: float = None,
+            force: bool = False,
+            prompt_each: bool = False,
+            yes: bool = False,
+            shards: int = 1
             ) -> None:
     '''
     runs the Structure-from-Motion command with the speficied configurations
     '''
-    
+
+    # make sure Ctrl-C also tears down any running COLMAP process group
+    install_sigint_handler(console=CONSOLE)
+
     preper: Preper = read_config_file(config_file=config_file)
 
-    # checking if valid vocab_tree arguments passed 
+    # one confirmation for the whole scene by default; --prompt-each restores the
+    # per-stage prompts and -y/--yes silences them for unattended batch runs
+    if yes:
+        prompt = False
+    elif prompt and not prompt_each:
+        prompt_user_command(command_name=f"all SfM stages for [{preper.image_dir}]", console=CONSOLE)
+        prompt = False
+
+    if num_threads is not None:
+        # Preper is frozen; __post_init__ caps the value to the CPU count
+        preper = replace(preper, num_threads=num_threads)
+
+    # sequential captures make exhaustive/vocab_tree matching O(N^2) for no gain,
+    # so auto-select the O(N*W) sequential matcher unless the user pinned the method
+    if not force_matching_method and preper.matching_method != "sequential" \
+            and is_sequential_capture(preper.image_dir):
+        CONSOLE.log(f"[bold yellow]:warning: Detected sequential image capture, overriding matching_method "
+                    f"<{preper.matching_method}> with <sequential>. Use --force-matching-method to keep the configured method.")
+        preper = replace(preper, matching_method="sequential")
+
+    # sharded extraction reorders image ids, which the sequential matcher relies on
+    if shards > 1 and preper.matching_method == "sequential":
+        CONSOLE.log("[bold yellow]:warning: Sharded extraction is incompatible with the sequential matcher, "
+                    "running extraction unsharded.")
+        shards = 1
+
+    # checking if valid vocab_tree arguments passed, before any COLMAP work starts
     if preper.matching_method == "vocab_tree":
-        if not vocab_tree_path.endswith(".fbow"):
-            raise FileNotFoundError(f"Supplied file [{vocab_tree_path}] does not end with '.fbow', a valid vocab tree path is needed.")
-        elif vocab_tree_path is None:
+        if vocab_tree_path is None:
             raise FileNotFoundError("If [matching_method] is <vocab_tree>, then a [vocab_tree_path] is needed.")
+        if not str(vocab_tree_path).endswith(".fbow"):
+            raise FileNotFoundError(f"Supplied file [{vocab_tree_path}] does not end with '.fbow', a valid vocab tree path is needed.")
+
+    # sub-scene chunks: pipeline the GPU and CPU stages instead of running strictly sequentially
+    image_dir = Path(preper.image_dir)
+    chunk_dirs = sorted(d for d in image_dir.iterdir() if d.is_dir()) if image_dir.is_dir() else []
+    if chunk_dirs and not any(f.is_file() for f in image_dir.iterdir()):
+        run_sfm_chunked(preper, chunk_dirs, output_dir, vocab_tree_path, prompt, verbose, timeout)
+        return
 
     colmap_cmd = 'colmap'
+    database_path = str(preper.database_path)
+    images_path = str(preper.image_dir)
+    use_gpu = str(preper.use_gpu)
+    threads = str(preper.num_threads)
 
-    # Feature extraction command 
-    feature_extractor_cmd = [
-        f"{colmap_cmd} feature_extractor",
-        f"--database_path {preper.database_path}",
-        f"--image_path {preper.image_dir}",
-        "--ImageReader.single_camera 1",
-        f"--ImageReader.camera_model {preper.camera_model}",
-        f"--SiftExtraction.use_gpu {preper.use_gpu}",
-    ]
-    
-    feature_extractor_cmd = " ".join(feature_extractor_cmd)
-    if verbose:
-        print(f"{feature_extractor_cmd=}")
-    
-    if prompt:
-        prompt_user_command(command_name="feature extraction", console=CONSOLE)
-
-    info_msg = f"Running feature extraction."
-    logger.info(f"Command >> {feature_extractor_cmd}")
-    logger.info(info_msg)
-    CONSOLE.log("[bold green]"+info_msg)
-    with status("Running...", spinner="moon", verbose=verbose, console=CONSOLE):
-        run_command(cmd=feature_extractor_cmd, verbose=verbose, console=CONSOLE)
-    info_msg = "Done extracting COLMAP features."
-    logger.info(info_msg) 
-    CONSOLE.log("[bold green]:tada:"+info_msg)
-    
-    # Feature matching command 
-    feature_matcher_cmd = [f"colmap {preper.matching_method}_matcher",
-        f"--database_path {preper.database_path}",
-        f"--SiftMatching.use_gpu {preper.use_gpu}"
-    ]
-    if preper.matching_method == "vocab_tree":
-        feature_matcher_cmd.append(f'--VocabTreeMatching.vocab_tree_path "{vocab_tree_path}"')
-    
-    feature_matcher_cmd = " ".join(feature_matcher_cmd)
-    if verbose:
-        print(f"{feature_matcher_cmd=}")
+    # Feature extraction command
+    feature_extractor_cmd = _cmd(
+        colmap_cmd, "feature_extractor",
+        "--database_path", database_path,
+        "--image_path", images_path,
+        "--ImageReader.single_camera", "1",
+        "--ImageReader.camera_model", str(preper.camera_model),
+        "--SiftExtraction.use_gpu", use_gpu,
+        "--SiftExtraction.num_threads", threads,
+    )
 
-    if prompt:
-        prompt_user_command(command_name="feature matching", console=CONSOLE)
+    # one live group for all stages instead of a spinner per stage
+    with make_progress(console=CONSOLE, verbose=verbose) as progress:
+        if not force and extraction_is_complete(preper.database_path, preper.image_dir):
+            info_msg = "Skipping feature extraction, the database already has features for every image."
+            info(info_msg, style="bold yellow")
+        else:
+            if verbose:
+                print(f"feature_extractor_cmd={' '.join(feature_extractor_cmd)}")
 
-    with status("Running...", spinner="moon", verbose=verbose, console=CONSOLE):
-        run_command(cmd=feature_extractor_cmd, verbose=verbose, console=CONSOLE)
-    
-    info_msg = f"Running {preper.matching_method} matcher feature matching."
-    logger.info(f"Command >> {feature_matcher_cmd}")
-    logger.info(info_msg)
-    CONSOLE.log("[bold green]"+info_msg)    
-    with status("Running...", spinner="moon", verbose=verbose, console=CONSOLE):
-        run_command(cmd=feature_matcher_cmd, verbose=verbose, console=CONSOLE)        
-    info_msg = "Done matching COLMAP features."
-    logger.info(info_msg) 
-    CONSOLE.log("[bold green]:tada:"+info_msg)
-    
-    # Mapping
-    sparse_dir = Path(output_dir) / preper.sfm_tool / "sparse"
-    sparse_dir.mkdir(parents=True, exist_ok=True)
+            if prompt:
+                prompt_user_command(command_name="feature extraction", console=CONSOLE)
+
+            info_msg = f"Running feature extraction."
+            logger.info("Command >> %s", " ".join(feature_extractor_cmd))
+            info(info_msg)
+            task = progress.add_task("feature_extractor", total=None)
+            if shards > 1:
+                run_sharded_extraction(preper, shards, verbose=verbose, timeout=timeout)
+            else:
+                run_command(cmd=feature_extractor_cmd, verbose=verbose, console=CONSOLE, timeout=timeout)
+            progress.remove_task(task)
+            info_msg = "Done extracting COLMAP features."
+            info(info_msg, emoji=":tada:")
+
+        # Feature matching command
+        feature_matcher_cmd = _cmd(
+            colmap_cmd, f"{preper.matching_method}_matcher",
+            "--database_path", database_path,
+            "--SiftMatching.use_gpu", use_gpu,
+            "--SiftMatching.num_threads", threads,
+        )
+        if preper.matching_method == "vocab_tree":
+            feature_matcher_cmd += ["--VocabTreeMatching.vocab_tree_path", str(vocab_tree_path)]
+        elif preper.matching_method == "sequential":
+            feature_matcher_cmd += ["--SequentialMatching.overlap", "10"]
+            if vocab_tree_path is not None:
+                # keep global loop closure through the vocab tree
+                feature_matcher_cmd += ["--SequentialMatching.loop_detection", "1"]
+                feature_matcher_cmd += ["--SequentialMatching.vocab_tree_path", str(vocab_tree_path)]
+
+        if not force and matching_is_complete(preper.database_path):
+            info_msg = "Skipping feature matching, the database already has verified matches."
+            info(info_msg, style="bold yellow")
+        else:
+            if verbose:
+                print(f"feature_matcher_cmd={' '.join(feature_matcher_cmd)}")
+
+            if prompt:
+                prompt_user_command(command_name="feature matching", console=CONSOLE)
 
-    mapper_cmd = [
-        f"{preper.sfm_tool} mapper",
-        f"--database_path {preper.database_path}",
-        f"--image_path {preper.image_dir}",
-        f"--output_path {sparse_dir}",
-    ]
+            info_msg = f"Running {preper.matching_method} matcher feature matching."
+            logger.info("Command >> %s", " ".join(feature_matcher_cmd))
+            info(info_msg)
+            task = progress.add_task(f"{preper.matching_method}_matcher", total=None)
+            run_command(cmd=feature_matcher_cmd, verbose=verbose, console=CONSOLE, timeout=timeout)
+            progress.remove_task(task)
+            info_msg = "Done matching COLMAP features."
+            info(info_msg, emoji=":tada:")
 
-    if preper.sfm_tool == 'colmap':
-        #if colmap_version >= Version("3.7"):
-        mapper_cmd.append("--Mapper.ba_global_function_tolerance=1e-6")
+        # Mapping
+        sparse_dir = Path(output_dir) / preper.sfm_tool / "sparse"
+        sparse_dir.mkdir(parents=True, exist_ok=True)
 
-    mapper_cmd = " ".join(mapper_cmd)
-    if verbose:
-        print(f"{mapper_cmd=}")
+        mapper_cmd = _cmd(
+            preper.sfm_tool, "mapper",
+            "--database_path", database_path,
+            "--image_path", images_path,
+            "--output_path", str(sparse_dir),
+            "--Mapper.num_threads", threads,
+        )
+
+        if preper.sfm_tool == 'colmap':
+            #if colmap_version >= Version("3.7"):
+            mapper_cmd.append("--Mapper.ba_global_function_tolerance=1e-6")
+
+        if not force and mapping_is_complete(sparse_dir):
+            info_msg = "Skipping mapping, a reconstruction already exists in the sparse directory."
+            info(info_msg, style="bold yellow")
+        else:
+            if verbose:
+                print(f"mapper_cmd={' '.join(mapper_cmd)}")
+
+            if prompt:
+                prompt_user_command(command_name="mapper", console=CONSOLE)
+
+            info_msg = f"Running {preper.sfm_tool} mapper."
+            logger.info("Command >> %s", " ".join(mapper_cmd))
+            info(info_msg)
+            task = progress.add_task("mapper", total=None)
+            run_command(cmd=mapper_cmd, verbose=verbose, console=CONSOLE, timeout=timeout)
+            progress.remove_task(task)
+            info_msg = "Done COLMAP mapping."
+            info(info_msg, emoji=":tada:")
+
+
+def run_sfm_chunked(preper: Preper,
+                    chunk_dirs: list,
+                    output_dir: Path,
+                    vocab_tree_path: Path,
+                    prompt: bool,
+                    verbose: bool = False,
+                    timeout: float = None
+                    ) -> None:
+    '''
+    runs the SfM stages over sub-scene chunks as a two-stage pipeline:
+    feature extraction (GPU-bound) for chunk i+1 overlaps matching/mapping (CPU-bound) for chunk i.
+    each chunk gets its own database so the stages never share a mutable DB.
+    '''
+    database_path = Path(preper.database_path)
+    # the GPU and CPU stages run concurrently, so give each half the thread budget
+    stage_threads = str(max(1, preper.num_threads // 2))
+
+    def chunk_database(i: int) -> Path:
+        return database_path.with_name(f"{database_path.stem}_chunk{i}{database_path.suffix}")
+
+    def run_gpu_stage(i: int) -> None:
+        feature_extractor_cmd = _cmd(
+            "colmap", "feature_extractor",
+            "--database_path", str(chunk_database(i)),
+            "--image_path", str(chunk_dirs[i]),
+            "--ImageReader.single_camera", "1",
+            "--ImageReader.camera_model", str(preper.camera_model),
+            "--SiftExtraction.use_gpu", str(preper.use_gpu),
+            "--SiftExtraction.num_threads", stage_threads,
+        )
+        if verbose:
+            print(f"feature_extractor_cmd={' '.join(feature_extractor_cmd)}")
+        info_msg = f"Running feature extraction for chunk {i}."
+        logger.info("Command >> %s", " ".join(feature_extractor_cmd))
+        info(info_msg)
+        task = progress.add_task(f"feature_extractor chunk {i}", total=None)
+        proc = run_command(cmd=feature_extractor_cmd, verbose=verbose, console=CONSOLE, async_mode=True)
+        wait_command(proc=proc, cmd=feature_extractor_cmd, console=CONSOLE, timeout=timeout)
+        progress.remove_task(task)
+        info_msg = f"Done extracting COLMAP features for chunk {i}."
+        info(info_msg, emoji=":tada:")
+
+    def run_cpu_stage(i: int) -> None:
+        feature_matcher_cmd = _cmd(
+            "colmap", f"{preper.matching_method}_matcher",
+            "--database_path", str(chunk_database(i)),
+            "--SiftMatching.use_gpu", str(preper.use_gpu),
+            "--SiftMatching.num_threads", stage_threads,
+        )
+        if preper.matching_method == "vocab_tree":
+            feature_matcher_cmd += ["--VocabTreeMatching.vocab_tree_path", str(vocab_tree_path)]
+        elif preper.matching_method == "sequential":
+            feature_matcher_cmd += ["--SequentialMatching.overlap", "10"]
+            if vocab_tree_path is not None:
+                feature_matcher_cmd += ["--SequentialMatching.loop_detection", "1"]
+                feature_matcher_cmd += ["--SequentialMatching.vocab_tree_path", str(vocab_tree_path)]
+        if verbose:
+            print(f"feature_matcher_cmd={' '.join(feature_matcher_cmd)}")
+        info_msg = f"Running {preper.matching_method} matcher feature matching for chunk {i}."
+        logger.info("Command >> %s", " ".join(feature_matcher_cmd))
+        info(info_msg)
+        task = progress.add_task(f"{preper.matching_method}_matcher chunk {i}", total=None)
+        proc = run_command(cmd=feature_matcher_cmd, verbose=verbose, console=CONSOLE, async_mode=True)
+        wait_command(proc=proc, cmd=feature_matcher_cmd, console=CONSOLE, timeout=timeout)
+        progress.remove_task(task)
+        info_msg = f"Done matching COLMAP features for chunk {i}."
+        info(info_msg, emoji=":tada:")
+
+        sparse_dir = Path(output_dir) / preper.sfm_tool / f"chunk_{i}" / "sparse"
+        sparse_dir.mkdir(parents=True, exist_ok=True)
+        mapper_cmd = _cmd(
+            preper.sfm_tool, "mapper",
+            "--database_path", str(chunk_database(i)),
+            "--image_path", str(chunk_dirs[i]),
+            "--output_path", str(sparse_dir),
+            "--Mapper.num_threads", stage_threads,
+        )
+        if preper.sfm_tool == 'colmap':
+            mapper_cmd.append("--Mapper.ba_global_function_tolerance=1e-6")
+        if verbose:
+            print(f"mapper_cmd={' '.join(mapper_cmd)}")
+        info_msg = f"Running {preper.sfm_tool} mapper for chunk {i}."
+        logger.info("Command >> %s", " ".join(mapper_cmd))
+        info(info_msg)
+        task = progress.add_task(f"mapper chunk {i}", total=None)
+        proc = run_command(cmd=mapper_cmd, verbose=verbose, console=CONSOLE, async_mode=True)
+        wait_command(proc=proc, cmd=mapper_cmd, console=CONSOLE, timeout=timeout)
+        progress.remove_task(task)
+        info_msg = f"Done COLMAP mapping for chunk {i}."
+        info(info_msg, emoji=":tada:")
 
     if prompt:
-        prompt_user_command(command_name="mapper", console=CONSOLE)
-
-    info_msg = f"Running {preper.sfm_tool} mapper."   
-    logger.info(f"Command >> {mapper_cmd}")
-    logger.info(info_msg)
-    CONSOLE.log("[bold green]"+info_msg)    
-    with status("Running...", spinner="moon", verbose=verbose, console=CONSOLE):
-        run_command(cmd=mapper_cmd, verbose=verbose, console=CONSOLE)    
-    info_msg = "Done COLMAP mapping."
-    logger.info(info_msg) 
-    CONSOLE.log("[bold green]:tada:"+info_msg)
-    
+        prompt_user_command(command_name=f"the SfM pipeline over {len(chunk_dirs)} chunks", console=CONSOLE)
+
+    info_msg = f"Running pipelined SfM over {len(chunk_dirs)} sub-scene chunks."
+    info(info_msg)
+    # one worker per stage: at any time at most one extractor (GPU) and one matcher/mapper (CPU) run
+    with make_progress(console=CONSOLE, verbose=verbose) as progress:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            gpu_future = executor.submit(run_gpu_stage, 0)
+            cpu_future = None
+            for i in range(len(chunk_dirs)):
+                gpu_future.result()
+                next_gpu = executor.submit(run_gpu_stage, i + 1) if i + 1 < len(chunk_dirs) else None
+                if cpu_future is not None:
+                    cpu_future.result()
+                cpu_future = executor.submit(run_cpu_stage, i)
+                gpu_future = next_gpu
+            cpu_future.result()
+    info_msg = "Done pipelined SfM over all chunks."
+    info(info_msg, emoji=":tada:")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Prepare input data for nerfstudio training via config file.")
     parser.add_argument('--config_file', required=True, type=Path, help="Path to the config file.")
     parser.add_argument('--output_dir', required=True, type=Path, help="Path to the output directory.")
     parser.add_argument('--vocab_tree_path', required=False, type=Path, help="Path to the vocab tree, only needed when <matching_method> is <vocab_tree>.")
-    parser.add_argument('-p', '--prompt', action='store_true', help="Flag to prompt each time before running a command.")
+    parser.add_argument('-p', '--prompt', action='store_true', help="Flag to prompt once before running the SfM stages.")
+    parser.add_argument('--prompt-each', action='store_true', help="Flag to prompt before every individual command instead of once up front.")
+    parser.add_argument('-y', '--yes', action='store_true', help="Flag to skip all prompts, for unattended runs.")
     parser.add_argument('-v', '--verbose', action='store_true', help="Flag to print command extra information about commands.")
+    parser.add_argument('--force-matching-method', action='store_true', help="Flag to keep the configured <matching_method> even when a sequential capture is detected.")
+    parser.add_argument('--num-threads', required=False, type=int, help="Thread count for the COLMAP stages, overrides the config value. (default: 64 capped to the CPU count)")
+    parser.add_argument('--shards', required=False, type=int, default=1, help="Number of parallel feature_extractor workers, round-robined over the visible GPUs. (default: 1)")
+    parser.add_argument('--force', action='store_true', help="Flag to re-run every stage even when its outputs already exist.")
+    parser.add_argument('--timeout', required=False, type=float, help="Seconds before a running COLMAP command is terminated. (default: no limit)")
     parser.add_argument('-l', '--log', action='store_true', help="Flag to log command outputs and information.")
     parser.add_argument('--log_file', required=False, type=Path, help="Logging file path, if [log] flag is set. (default: command_logs.log)")
     
@@ -129,25 +479,18 @@ if __name__ == "__main__":
     # TODO: turn colmaped data into nerfstudio data
     # TODO: make nerfacto feature
 
-    CONSOLE = Console(width=120)
-
-    args = parser.parse_args()    
-    logger = logging.getLogger(__name__)
+    args = parser.parse_args()
 
     if args.log:
-        print("OK")
-        logging.basicConfig(filename=args.log_file if args.log_file else "command_logs.log", 
-                            format='%(asctime)s : %(levelname)s : %(message)s',
-                            filemode='w',
-                            level=logging.INFO)
-    else:
-        print("NOT OK")
-    # 
-   
+        # append + rotate so repeated invocations don't truncate earlier runs' logs
+        handler = RotatingFileHandler(args.log_file if args.log_file else "command_logs.log",
+                                      mode='a', maxBytes=10*1024*1024, backupCount=3)
+        handler.setFormatter(logging.Formatter('%(asctime)s : %(levelname)s : %(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        root_logger.setLevel(logging.INFO)
 
-
-    
-    run_sfm(args.config_file, args.output_dir, args.vocab_tree_path, args.prompt, args.verbose)
+    run_sfm(args.config_file, args.output_dir, args.vocab_tree_path, args.prompt, args.verbose, args.force_matching_method, args.num_threads, args.timeout, args.force, args.prompt_each, args.yes, args.shards)
     # sfm to nerfacto
     # train model
 
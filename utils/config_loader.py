@@ -1,50 +1,113 @@
+import os
+from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from dataclasses import dataclass, fields, _MISSING_TYPE
+from dataclasses import dataclass
 from typing import Literal, get_type_hints
-import yaml 
+import yaml
 
+try:
+    # libyaml-backed loader, 5-10x faster than the pure-Python scanner
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
-@dataclass
+
+class _StrEnum(str, Enum):
+    '''
+    string-backed enum whose str()/f-string form is the raw value,
+    so members embed directly into COLMAP command arguments
+    '''
+    __str__ = str.__str__
+
+
+class TrainMethod(_StrEnum):
+    NERFACTO = "nerfacto"
+    SPLATFACTO = "splatfacto"
+
+class SfmTool(_StrEnum):
+    COLMAP = "colmap"
+    GLOMAP = "glomap"
+
+class MatchingMethod(_StrEnum):
+    EXHAUSTIVE = "exhaustive"
+    SEQUENTIAL = "sequential"
+    VOCAB_TREE = "vocab_tree"
+
+class CameraModel(_StrEnum):
+    OPENCV = "OPENCV"
+    OPENCV_FISHEYE = "OPENCV_FISHEYE"
+    EQUIRECTANGULAR = "EQUIRECTANGULAR"
+    PINHOLE = "PINHOLE"
+    SIMPLE_PINHOLE = "SIMPLE_PINHOLE"
+
+
+@dataclass(slots=True, frozen=True)
 class Preper:
-    train_method: Literal["nerfacto", "splatfacto"] = "nerfacto"
-    sfm_tool: Literal["colmap", "glomap"] = "colmap"
-    matching_method: Literal["exhaustive", "sequential", "vocab_tree"] = "vocab_tree"
+    train_method: TrainMethod = TrainMethod.NERFACTO
+    sfm_tool: SfmTool = SfmTool.COLMAP
+    matching_method: MatchingMethod = MatchingMethod.VOCAB_TREE
     database_path: Path = Path("")
     image_dir: Path = Path("")
-    camera_model: Literal["OPENCV", "OPENCV_FISHEYE", "EQUIRECTANGULAR", "PINHOLE", "SIMPLE_PINHOLE"] = "OPENCV"
+    camera_model: CameraModel = CameraModel.OPENCV
     use_gpu: Literal[0,1] = 1
+    # COLMAP's mapper plateaus around 64 threads; more just oversubscribes
+    num_threads: int = 64
 
     def __post_init__(self) -> None:
         '''
         makes sure fields that were given from the config file are correctly passed
         '''
-        type_hints = get_type_hints(self.__class__)
+        object.__setattr__(self, 'num_threads', min(self.num_threads, os.cpu_count() or self.num_threads))
+        # the enum constructors raise ValueError on anything outside the closed set
+        for name, enum_cls in _ENUM_FIELDS.items():
+            field_value = getattr(self, name)
+            if field_value is None:
+                raise ValueError(f"No value was passed for field : {name}")
+            object.__setattr__(self, name, enum_cls(field_value))
+        for name, allowed in _ALLOWED_SETS.items():
+            field_value = getattr(self, name)
+            if field_value is None:
+                raise ValueError(f"No value was passed for field : {name}")
+            if field_value not in allowed:
+                raise ValueError(f"Invalid value <{field_value} for field [{name}]. Allowed values are: {tuple(allowed)}.")
+
+        # resolve the paths once up front so a missing/empty path fails here
+        # instead of deep inside COLMAP after the expensive GPU stages ran
+        for name in ("database_path", "image_dir"):
+            if getattr(self, name) is None or str(getattr(self, name)) in ("", "."):
+                raise ValueError(f"No value was passed for field : {name}")
+            object.__setattr__(self, name, Path(getattr(self, name)).expanduser().resolve(strict=False))
+        if not self.image_dir.is_dir():
+            raise FileNotFoundError(f"Image directory [{self.image_dir}] does not exist.")
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
 
-        for field in fields(self):
-            if hasattr(type_hints[field.name], '__args__'):
-                field_value = getattr(self, field.name)
-                allowed_values = field.type.__args__
-                if field_value not in allowed_values:
-                    raise ValueError(f"Invalid value <{field_value} for field [{field.name}]. Allowed values are: {allowed_values}.")
 
-                if not isinstance(field.default, _MISSING_TYPE) and getattr(self, field.name) is None:
-                    raise ValueError(f"No value was passed for field : {field.name}")
+# the class schema is immutable, so resolve the type hints once at import
+# instead of paying for get_type_hints() reflection on every instance.
+# the remaining Literal fields are a closed set, and frozenset membership is O(1)
+_TYPE_HINTS = get_type_hints(Preper)
+_ENUM_FIELDS = {"train_method": TrainMethod, "sfm_tool": SfmTool,
+                "matching_method": MatchingMethod, "camera_model": CameraModel}
+_LITERAL_FIELDS = ("use_gpu",)
+_ALLOWED_SETS = {name: frozenset(_TYPE_HINTS[name].__args__) for name in _LITERAL_FIELDS}
 
 
 
 
 def read_config_file(config_file: Path) -> Preper:
     '''
-    reads the fields from the config file and creates a preper 
+    reads the fields from the config file and creates a preper.
+    parses are memoized per (path, mtime) so batched per-sub-scene runs
+    reparse the YAML only when the file actually changed
     '''
+    config_file = Path(config_file).resolve()
+    return _read_config_file_cached(config_file, config_file.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _read_config_file_cached(config_file: Path, mtime_ns: int) -> Preper:
     with open(config_file, 'r') as f:
-        data = yaml.load(f, Loader=yaml.SafeLoader)
-    
-    # print(data)
-    return Preper(train_method=data['train_method'],\
-                sfm_tool=data['sfm_tool'], \
-                matching_method=data['matching_method'],
-                database_path=data['database_path'],
-                image_dir=data['image_dir'],
-                camera_model=data['camera_model'],
-                use_gpu=data['use_gpu'])
\ No newline at end of file
+        data = yaml.load(f, Loader=SafeLoader)
+
+    return Preper(**{k: data[k] for k in Preper.__dataclass_fields__ if k in data})
\ No newline at end of file
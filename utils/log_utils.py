@@ -1,40 +1,184 @@
+import functools
+import logging
+import os
+import signal
 import sys
 import subprocess
+import threading
+from collections import deque
 from typing import Optional
-from contextlib import nullcontext
 from rich.console import Console
+from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 
-def run_command(cmd: str, verbose=False, console: Console=None) -> Optional[str]:
+logger = logging.getLogger(__name__)
+
+@functools.cache
+def get_console() -> Console:
+    """Returns the process-wide console singleton.
+
+    Created lazily so importing this module doesn't stat the terminal, and
+    width is left to Rich's auto-detection instead of a hardcoded value.
+    """
+    return Console()
+
+def info(msg: str, style: str = "bold green", emoji: str = ""):
+    """Emits a message once to the logger and once to the console.
+
+    Args:
+        msg: The message to emit.
+        style: Rich style for the console line.
+        emoji: Optional emoji code prefixed on the console line only.
+    """
+    logger.info(msg)
+    get_console().log(f"[{style}]{emoji}{msg}")
+
+# how many trailing output lines to keep for error reporting; bounds memory
+# to ~tens of KB no matter how much a long mapper run prints
+TAIL_LINES = 512
+
+# commands currently running, so a SIGINT can be forwarded to their process groups
+_active_procs = set()
+
+def _terminate_process_group(proc: subprocess.Popen):
+    """Sends SIGTERM to a command's process group, escalating to SIGKILL.
+
+    Commands are started with start_new_session=True, so the child pid is
+    also its process group id and the whole COLMAP process tree is reached.
+
+    Args:
+        proc: The running process handle.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+def _start_watchdog(proc: subprocess.Popen, timeout: Optional[float]) -> Optional[threading.Timer]:
+    """Starts a timer that kills the command's process group after timeout seconds.
+
+    Args:
+        proc: The running process handle.
+        timeout: Seconds before the process group is terminated, or None for no limit.
+    """
+    if timeout is None:
+        return None
+    watchdog = threading.Timer(timeout, _terminate_process_group, args=(proc,))
+    watchdog.daemon = True
+    watchdog.start()
+    return watchdog
+
+def install_sigint_handler(console: Console = None):
+    """Installs a SIGINT handler that terminates the active command process groups.
+
+    Without this, Ctrl-C only kills the Python wrapper and the COLMAP child
+    keeps running, holding the GPU and the database lock.
+
+    Args:
+        console: The console to report the interrupt on.
+    """
+    def _handler(signum, frame):
+        for proc in list(_active_procs):
+            _terminate_process_group(proc)
+        if console is not None:
+            console.log("[bold red]:x: Interrupted, terminated running commands.")
+        sys.exit(130)
+    signal.signal(signal.SIGINT, _handler)
+
+def run_command(cmd: list, verbose=False, console: Console=None, async_mode: bool=False,
+                timeout: float=None, env: dict=None) -> Optional[str]:
     """Runs a command and returns the output.
 
     Args:
-        cmd: Command to run.
-        verbose: If True, logs the output of the command.
+        cmd: Command to run, as an argv list.
+        verbose: If True, streams the output of the command as it is produced.
+        async_mode: If True, returns the running process handle immediately instead of blocking.
+        timeout: Seconds before the command's process group is killed, or None for no limit.
+        env: Environment for the command; inherits the current one if None.
+    Returns:
+        The last TAIL_LINES lines of the command output.
+        If async_mode is True, the subprocess.Popen handle of the running command.
+    """
+    proc = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            bufsize=1, text=True, start_new_session=True, env=env)
+    _active_procs.add(proc)
+    if async_mode:
+        return proc
+    watchdog = _start_watchdog(proc, timeout)
+    tail = deque(maxlen=TAIL_LINES)
+    try:
+        for line in proc.stdout:
+            if verbose:
+                console.print(line, end="")
+            else:
+                tail.append(line)
+        proc.wait()
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        _active_procs.discard(proc)
+    if proc.returncode != 0:
+        _print_command_error(cmd, "".join(tail), console)
+    return "".join(tail)
+
+def wait_command(proc: subprocess.Popen, cmd: list, console: Console=None,
+                 timeout: float=None) -> Optional[str]:
+    """Waits on a process handle returned by run_command(async_mode=True).
+
+    Args:
+        proc: The running process handle.
+        cmd: Command the handle was started with, used for error reporting.
+        timeout: Seconds before the command's process group is killed, or None for no limit.
     Returns:
-        The output of the command if return_output is True, otherwise None.
-    """
-    out = subprocess.run(cmd, capture_output=not verbose, shell=True, check=False)
-    if out.returncode != 0:
-        console.rule("[bold red] :skull: :skull: :skull: ERROR :skull: :skull: :skull: ", style="red")
-        console.print(f"[bold red]Error running command: {cmd}")
-        console.rule(style="red")
-        console.print(out.stderr.decode("utf-8"))
-        sys.exit(1)
-    if out.stdout is not None:
-        return out.stdout.decode("utf-8")
-    return out
-
-def status(msg: str, spinner: str = "bouncingBall", verbose: bool = False, console: Console = None):
-    """A context manager that does nothing is verbose is True. Otherwise it hides logs under a message.
+        The last TAIL_LINES lines of the command output.
+    """
+    watchdog = _start_watchdog(proc, timeout)
+    tail = deque(maxlen=TAIL_LINES)
+    try:
+        for line in proc.stdout:
+            tail.append(line)
+        proc.wait()
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        _active_procs.discard(proc)
+    if proc.returncode != 0:
+        _print_command_error(cmd, "".join(tail), console)
+    return "".join(tail)
+
+def _print_command_error(cmd: list, output: str, console: Console):
+    console.rule("[bold red] :skull: :skull: :skull: ERROR :skull: :skull: :skull: ", style="red")
+    console.print(f"[bold red]Error running command: {' '.join(cmd)}")
+    console.rule(style="red")
+    if output:
+        console.print(output)
+    sys.exit(1)
+
+def make_progress(console: Console = None, verbose: bool = False) -> Progress:
+    """Creates the single live progress group that tracks all SfM stages.
+
+    One Progress renders every stage as its own task, so concurrent stages
+    share one render thread instead of stacking separate status spinners.
 
     Args:
-        msg: The message to log.
-        spinner: The spinner to use.
-        verbose: If True, print all logs, else hide them.
+        console: The console to render on.
+        verbose: If True, disable the live rendering so raw logs stay visible.
     """
-    if verbose:
-        return nullcontext()
-    return console.status(msg, spinner=spinner)
+    return Progress(
+        SpinnerColumn(spinner_name="moon"),
+        TextColumn("[progress.description]{task.description}"),
+        TimeElapsedColumn(),
+        console=console,
+        transient=True,
+        refresh_per_second=4,
+        disable=verbose,
+    )
 
 def prompt_user_command(command_name: str, console: Console):
     choice = input(f"Do you want to run {command_name}? [y]/n\n")